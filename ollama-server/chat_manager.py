@@ -1,123 +1,334 @@
 """Module for managing continuous chat history per model"""
 import os
-import json
+import sys
+import queue
+import atexit
 import datetime
-from typing import List, Dict
+import functools
+import threading
+import weakref
+from collections import OrderedDict, deque
+from typing import List, Dict, Deque, Optional, Tuple
 import pathlib
+import orjson
 from log import setup_colored_logging
 
 # Set up logger
 logger = setup_colored_logging("chat_manager")
 
+# Interned role names so every message dict shares the same string objects
+ROLE_SYSTEM = sys.intern("system")
+ROLE_USER = sys.intern("user")
+ROLE_ASSISTANT = sys.intern("assistant")
+
+@functools.lru_cache(maxsize=256)
+def canonical_model_name(model_name: str) -> str:
+    """Normalize a model name (e.g. 'llama3.2:latest' -> 'Llama3.2') for history lookup and display"""
+    return model_name.split(':', 1)[0].capitalize()
+
+class HistoryWriter:
+    """Background writer that batches history file writes off the event loop"""
+    def __init__(self, max_batch: int = 32):
+        self.max_batch = max_batch
+        self.queue: "queue.Queue[Tuple[str, bool, bytes]]" = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self.thread.start()
+
+    def append(self, path: str, data: bytes):
+        """Queue data to be appended to a file"""
+        self.queue.put((path, False, data))
+
+    def write(self, path: str, data: bytes):
+        """Queue data to replace the contents of a file"""
+        self.queue.put((path, True, data))
+
+    def flush(self):
+        """Block until every queued write has reached its file"""
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                if len(batch) == 1:
+                    # Single pending write (the usual single-user case): write it directly
+                    self._write_file(*batch[0])
+                else:
+                    self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write_batch(self, batch: List[Tuple[str, bool, bytes]]):
+        """Coalesce the batch into a single write per file, preserving order"""
+        files: "OrderedDict[str, Tuple[bool, List[bytes]]]" = OrderedDict()
+        for path, truncate, data in batch:
+            if truncate or path not in files:
+                # A rewrite supersedes everything queued before it for this file
+                files[path] = (truncate, [data])
+            else:
+                files[path][1].append(data)
+
+        for path, (truncate, chunks) in files.items():
+            self._write_file(path, truncate, b"".join(chunks))
+
+    @staticmethod
+    def _write_file(path: str, truncate: bool, data: bytes):
+        flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        flags |= os.O_TRUNC if truncate else os.O_APPEND
+        try:
+            fd = os.open(path, flags, 0o644)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
+        except Exception as e:
+            logger.error("Error writing chat history file %s: %s", path, e)
+
+# Shared writer for all model histories
+history_writer = HistoryWriter()
+atexit.register(history_writer.flush)
+
 class ModelChatHistory:
     """Class to manage persistent chat history for a model"""
     def __init__(self, model_name: str, history_dir: str = "chat_history"):
-        self.model_name = model_name.split(':')[0].capitalize()
+        self.model_name = canonical_model_name(model_name)
         self.history_dir = history_dir
-        self.history_file = f"{history_dir}/{model_name}_history.json"
-        self.messages = []
+        self.history_file = f"{history_dir}/{model_name}_history.jsonl"
+        self.meta_file = f"{history_dir}/{model_name}_meta.json"
+        self.legacy_history_file = f"{history_dir}/{model_name}_history.json"
+        # The window grows append-only up to max_history_length messages and is
+        # then cut back to min_history_length in one step. Between cuts every
+        # request extends the previous one, so Ollama can reuse its prompt cache.
+        self.min_history_length = 25
         self.max_history_length = 50
         self.system_message = "You are a helpful and polite AI assistant. You always keep the the conversation light and try your best and provide answer to the point giving appropriate response."
-        print(model_name.split(':')[0].capitalize())
+        # The system prompt is kept apart from the sliding window of chat messages
+        self._system = {"role": ROLE_SYSTEM, "content": self.system_message}
+        self._history: Deque[Dict[str, str]] = deque(maxlen=self.max_history_length)
+        # Each message pre-serialized once, so requests and the log never re-encode it
+        self._system_bytes = orjson.dumps(self._system)
+        self._history_bytes: Deque[bytes] = deque(maxlen=self.max_history_length)
+        # Message list and JSON array built on demand and reused until the history changes
+        self._messages_cache: Optional[List[Dict[str, str]]] = None
+        self._messages_json_cache: Optional[bytes] = None
+        # History is read from disk on first use, not on construction
+        self.loaded = False
         os.makedirs(self.history_dir, exist_ok=True)
+        logger.debug("Created chat history for model %s", self.model_name)
 
-        self.load_history()
+    def ensure_loaded(self):
+        """Load chat history from file if it has not been loaded yet"""
+        if not self.loaded:
+            self.load_history()
 
     def load_history(self):
         """Load chat history from file"""
+        self.loaded = True
         try:
+            # Make sure queued writes for this model have landed before reading
+            history_writer.flush()
             if os.path.exists(self.history_file):
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.messages = data.get('messages', [])
-                    logger.info("Loaded %d messages from history for model %s",
-                               len(self.messages), self.model_name)
+                records = []
+                skipped = 0
+                with open(self.history_file, 'rb') as f:
+                    for line_number, line in enumerate(f, 1):
+                        if not line.strip():
+                            continue
+                        # A torn append (crash, full disk) only loses its own line
+                        try:
+                            record = orjson.loads(line)
+                        except orjson.JSONDecodeError:
+                            record = None
+                        if not (isinstance(record, dict) and "role" in record and "content" in record):
+                            skipped += 1
+                            logger.warning("Skipping unreadable line %d in %s",
+                                           line_number, self.history_file)
+                            continue
+                        records.append(record)
+                self._set_messages(records)
+                if skipped or len(records) > len(self._history) + 1:
+                    # Rewrite a log that has broken lines or holds more than the
+                    # window, so it matches what was loaded and later appends
+                    # start on a clean line
+                    self.save_history()
+                logger.info("Loaded %d messages from history for model %s",
+                           len(self._history) + 1, self.model_name)
+            elif os.path.exists(self.legacy_history_file):
+                # Migrate the old single-document history to the JSONL log
+                with open(self.legacy_history_file, 'rb') as f:
+                    data = orjson.loads(f.read())
+                self._set_messages(data.get('messages', []))
+                self.save_history()
+                logger.info("Migrated %d messages from legacy history for model %s",
+                           len(self._history) + 1, self.model_name)
             else:
                 logger.info("No history file found for model %s, starting fresh", self.model_name)
                 # Initialize with system message if starting fresh
-                system_message = {
-                    "role": "system", 
-                    "content": self.system_message
-                }
-                self.messages = [system_message]
+                self._set_messages([])
                 self.save_history()
         except Exception as e:
             logger.error("Error loading chat history for model %s: %s", self.model_name, e)
+            self._set_messages([])
 
-            system_message = {
-                "role": "system", 
-                "content": self.system_message
-            }
-            self.messages = [system_message]
+    def _set_messages(self, records: List[Dict[str, str]]):
+        """Replace the in-memory history with stored records"""
+        self._invalidate_cache()
+        if records and records[0]["role"] == ROLE_SYSTEM:
+            self._system = self._new_message(ROLE_SYSTEM, records[0]["content"])
+            records = records[1:]
+        else:
+            self._system = {"role": ROLE_SYSTEM, "content": self.system_message}
+        self._system_bytes = orjson.dumps(self._system)
+
+        # Keep only the most recent messages that fit the window
+        self._history.clear()
+        self._history_bytes.clear()
+        records = records[-self.max_history_length:]
+        for record in records:
+            self._push_message(self._new_message(record["role"], record["content"]))
 
     def add_message(self, role: str, content: str):
         """Add a message to the history"""
-        message = {"role": role, "content": content}
-        self.messages.append(message)
-
-        if len(self.messages) > self.max_history_length + 1:
-            # Keep the first message (system prompt) and the most recent messages
-            self.messages = [self.messages[0]] + self.messages[-(self.max_history_length):]
+        self.ensure_loaded()
+        cut = len(self._history) >= self.max_history_length
+        if cut:
+            # Leave room for the new message within the smaller window
+            while len(self._history) >= self.min_history_length:
+                self._evict_oldest()
+        encoded = self._push_message(self._new_message(role, content))
 
-        # Save after each update
-        self.save_history()
+        # A cut rewrites the log to match the window, so a reload picks up the
+        # same messages; between cuts the new message is simply appended
+        if cut:
+            self.save_history()
+        else:
+            self.append_message(encoded)
         logger.debug("Added message with role '%s' to model history", role)
 
+    def _push_message(self, message: Dict[str, str]) -> bytes:
+        """Append a message to the window, returning its serialized form"""
+        self._invalidate_cache()
+        encoded = orjson.dumps(message)
+        self._history.append(message)
+        self._history_bytes.append(encoded)
+        return encoded
+
+    def _evict_oldest(self):
+        """Drop the oldest message from the window"""
+        self._invalidate_cache()
+        self._history.popleft()
+        self._history_bytes.popleft()
+
+    def _invalidate_cache(self):
+        """Forget the cached message list and JSON array after the history changes"""
+        self._messages_cache = None
+        self._messages_json_cache = None
+
+    def _new_message(self, role: str, content: str) -> Dict[str, str]:
+        """Build a message dict with an interned role"""
+        return {"role": sys.intern(role), "content": content}
+
+    def append_message(self, encoded: bytes):
+        """Queue a single serialized message to be appended to the history file"""
+        try:
+            history_writer.append(self.history_file, encoded + b"\n")
+        except Exception as e:
+            logger.error("Error appending chat history for model %s: %s", self.model_name, e)
+
     def save_history(self):
-        """Save chat history to file"""
+        """Queue a rewrite of the history file and its metadata from the in-memory messages"""
         try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'model': self.model_name,
-                    'updated_at': datetime.datetime.now().isoformat(),
-                    'messages': self.messages
-                }, f, ensure_ascii=False, indent=2)
+            self.ensure_loaded()
+            lines = b"\n".join((self._system_bytes, *self._history_bytes)) + b"\n"
+            history_writer.write(self.history_file, lines)
+
+            meta = orjson.dumps({
+                'model': self.model_name,
+                'updated_at': datetime.datetime.now().isoformat()
+            })
+            history_writer.write(self.meta_file, meta)
             logger.debug("Saved chat history for model %s", self.model_name)
         except Exception as e:
             logger.error("Error saving chat history for model %s: %s", self.model_name, e)
 
     def get_messages(self) -> List[Dict[str, str]]:
-        """Get all messages in history"""
-        return self.messages
+        """Get all messages in history, starting with the system message"""
+        self.ensure_loaded()
+        if self._messages_cache is None:
+            self._messages_cache = [self._system, *self._history]
+        return self._messages_cache
+
+    def get_messages_json(self) -> bytes:
+        """Get all messages in history as a serialized JSON array"""
+        self.ensure_loaded()
+        if self._messages_json_cache is None:
+            self._messages_json_cache = (b"[" + b",".join((self._system_bytes, *self._history_bytes))
+                                         + b"]")
+        return self._messages_json_cache
 
     def clear_history(self):
         """Clear the chat history except for the system message"""
-        if self.messages and self.messages[0]["role"] == "system":
-            # Keep only the system message
-            system_message = self.messages[0]
-            self.messages = [system_message]
-        else:
-            # Create a default system message if none exists
-            system_message = {
-                "role": "system", 
-                "content": self.system_message
-            }
-            self.messages = [system_message]
+        self._invalidate_cache()
+        self._history.clear()
+        self._history_bytes.clear()
 
+        # Clearing replaces the file, so there is nothing left to load
+        self.loaded = True
         self.save_history()
         logger.info("Cleared chat history for model %s", self.model_name)
 
 class ModelHistoryManager:
     """Manager for model chat histories"""
-    def __init__(self, history_dir: str = "chat_history"):
+    def __init__(self, history_dir: str = "chat_history", max_loaded_histories: int = 4):
         self.history_dir = history_dir
-        self.model_histories: Dict[str, ModelChatHistory] = {}
+        self.max_loaded_histories = max_loaded_histories
+        # Most recently used histories last; the oldest is dropped past the cap
+        self.model_histories: "OrderedDict[str, ModelChatHistory]" = OrderedDict()
+        # Every history still referenced anywhere, e.g. by an open WebSocket. An
+        # evicted history in use is handed back instead of loading a second copy
+        # of the same file.
+        self._live_histories: "weakref.WeakValueDictionary[str, ModelChatHistory]" = (
+            weakref.WeakValueDictionary()
+        )
 
         # Create history directory if it doesn't exist
         os.makedirs(self.history_dir, exist_ok=True)
 
     def get_model_history(self, model_name: str) -> ModelChatHistory:
         """Get or create history for a model"""
-        model_name = model_name.split(':')[0].capitalize()
-        if model_name not in self.model_histories:
-            self.model_histories[model_name] = ModelChatHistory(model_name, self.history_dir)
-        return self.model_histories[model_name]
+        model_name = canonical_model_name(model_name)
+        history = self.model_histories.get(model_name)
+        if history is not None:
+            self.model_histories.move_to_end(model_name)
+            return history
+
+        history = self._live_histories.get(model_name)
+        if history is None:
+            history = ModelChatHistory(model_name, self.history_dir)
+            self._live_histories[model_name] = history
+        self.model_histories[model_name] = history
+        if len(self.model_histories) > self.max_loaded_histories:
+            # Every message is already persisted as it is added, so the evicted
+            # history is only kept alive by whoever still uses it
+            evicted_name, _ = self.model_histories.popitem(last=False)
+            logger.debug("Evicted chat history for model %s from memory", evicted_name)
+        return history
 
     def list_available_models(self) -> List[str]:
         """List models that have saved history"""
         try:
-            history_files = list(pathlib.Path(self.history_dir).glob("*_history.json"))
-            models = [f.name.replace('_history.json', '') for f in history_files]
+            history_writer.flush()
+            history_files = list(pathlib.Path(self.history_dir).glob("*_history.jsonl"))
+            models = [f.name.replace('_history.jsonl', '') for f in history_files]
             return models
         except Exception as e:
             logger.error("Error listing available model histories: %s", e)
@@ -125,12 +336,8 @@ class ModelHistoryManager:
 
     def clear_model_history(self, model_name: str):
         """Clear history for a specific model"""
-        if model_name in self.model_histories:
-            self.model_histories[model_name].clear_history()
-        else:
-            # Create and immediately clear the history
-            history = self.get_model_history(model_name)
-            history.clear_history()
+        # Histories load lazily, so this never reads the file being cleared
+        self.get_model_history(model_name).clear_history()
 
     def clear_all_histories(self):
         """Clear history for all models"""
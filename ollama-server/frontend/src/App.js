@@ -170,7 +170,16 @@ function App() {
             setCurrentResponse('');
           } 
           else if (data.type === 'stream') {
-            setCurrentResponse(prev => prev + data.content);
+            // The first and last frames of a response carry start/end flags
+            if (data.start) {
+              setIsStreaming(true);
+              setCurrentResponse(data.content);
+            } else {
+              setCurrentResponse(prev => prev + data.content);
+            }
+            if (data.end) {
+              setIsStreaming(false);
+            }
           } 
           else if (data.type === 'stream_end') {
             setIsStreaming(false);
@@ -233,6 +242,10 @@ function App() {
       { type: 'user', content: inputMessage }
     ]);
     
+    // The response is pending until the server flags its last frame
+    setIsStreaming(true);
+    setCurrentResponse('');
+
     // Send message to WebSocket
     socketRef.current.send(JSON.stringify({
       type: 'message',
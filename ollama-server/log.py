@@ -1,5 +1,6 @@
 import logging
 import sys
+import time
 
 # ANSI color codes
 BLACK = '\033[0;30m'
@@ -13,7 +14,26 @@ WHITE = '\033[0;37m'
 BOLD = '\033[1m'
 NC = '\033[0m'  # No Color
 
-class ColoredFormatter(logging.Formatter):
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that reuses the formatted timestamp for records within the same second"""
+
+    def __init__(self, fmt=None, datefmt=None):
+        super().__init__(fmt, datefmt)
+        # (second, formatted time) of the last record
+        self._cached_time = (None, "")
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        cached_second, cached_text = self._cached_time
+        if second != cached_second:
+            cached_text = time.strftime(datefmt or self.default_time_format,
+                                        self.converter(record.created))
+            self._cached_time = (second, cached_text)
+        if datefmt:
+            return cached_text
+        return self.default_msec_format % (cached_text, record.msecs)
+
+class ColoredFormatter(CachedTimeFormatter):
     """Custom formatter to add colors to log messages based on level"""
 
     COLORS = {
@@ -24,11 +44,21 @@ class ColoredFormatter(logging.Formatter):
         logging.CRITICAL: MAGENTA + BOLD,
     }
 
+    def __init__(self, fmt=None, datefmt=None):
+        super().__init__(fmt, datefmt)
+        fmt = self._fmt
+        # One formatter per level with its color baked into the format string;
+        # uncolored levels skip the wrapping entirely
+        self.level_formatters = {
+            level: CachedTimeFormatter(fmt if color == NC else f"{color}{fmt}{NC}", datefmt)
+            for level, color in self.COLORS.items()
+        }
+
     def format(self, record):
-        # Get the original message
-        log_message = super().format(record)
-        # Apply color based on log level
-        return f"{self.COLORS.get(record.levelno, NC)}{log_message}{NC}"
+        formatter = self.level_formatters.get(record.levelno)
+        if formatter is None:
+            return super().format(record)
+        return formatter.format(record)
 
 def setup_colored_logging(name=None, level=logging.INFO):
     """
@@ -73,7 +103,9 @@ def setup_colored_logging(name=None, level=logging.INFO):
 # Convenience functions for direct colored printing
 def print_colored(text, color):
     """Print colored text to terminal"""
-    print(f"{color}{text}{NC}")
+    # A single write skips print()'s sep/end handling; it stays on the text
+    # layer so output keeps its order relative to print() and logging
+    sys.stdout.write(f"{color}{text}{NC}\n")
 
 def print_info(text):
     """Print info message in green"""
@@ -1,19 +1,25 @@
 """Module to start the Ollama server with continuous chat history"""
 import asyncio
-import json
-from typing import List, Dict
+import os
+import platform
+import sys
+import time
+from typing import List, Dict, Optional
 from pydantic import BaseModel
+import orjson
 import uvicorn
 import aiohttp
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from log import setup_colored_logging
-from chat_manager import ModelHistoryManager
+from chat_manager import ModelHistoryManager, canonical_model_name
 
 # Set up the logger for this file
 logger = setup_colored_logging("ollama_server")
 
-app = FastAPI(title="Ollama Chat API")
+# REST responses are rendered with orjson, like the WebSocket frames
+app = FastAPI(title="Ollama Chat API", default_response_class=ORJSONResponse)
 
 # Configure CORS for frontend access
 app.add_middleware(
@@ -24,30 +30,240 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Constant WebSocket frames, encoded once instead of per message
+STREAM_END = orjson.dumps({"type": "stream_end"}).decode()
+HISTORY_CLEARED = orjson.dumps({"type": "history_cleared"}).decode()
+OLLAMA_UNAVAILABLE = orjson.dumps({
+    "type": "system",
+    "content": "Failed to start Ollama service"
+}).decode()
+# Error frames share a fixed envelope; only the message is encoded per error
+ERROR_PREFIX = '{"type":"error","content":'
+# Streamed chunks only need their content escaped into this envelope. The
+# first and last frames of a response carry "start"/"end" flags instead of
+# separate stream_start/stream_end messages.
+STREAM_PREFIX = '{"type":"stream","content":'
+STREAM_START_FLAG = ',"start":true'
+STREAM_END_FLAG = ',"end":true'
+STREAM_SUFFIX = '}'
+# Streamed chunks are coalesced into one frame until this many characters are
+# pending, or this many seconds after the first of them arrived. The interval
+# spans a few tokens at typical local generation speeds while staying under one
+# display frame.
+STREAM_FLUSH_CHARS = 512
+STREAM_FLUSH_INTERVAL = 0.015
+
+class StreamCoalescer:
+    """Coalesce streamed chunks into fewer WebSocket frames"""
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.pending: List[str] = []
+        self.pending_chars = 0
+        # Whether the frame flagged as the start of the response has been sent
+        self.started = False
+        # Keeps frames in order between the timer flush and the stream loop
+        self.lock = asyncio.Lock()
+        self.timer: Optional[asyncio.TimerHandle] = None
+        # The running timer flush; the event loop only keeps a weak reference to tasks
+        self.flush_task: Optional[asyncio.Task] = None
+
+    async def add(self, chunk: str):
+        """Queue a chunk, sending the pending text once enough has built up"""
+        if not chunk:
+            return
+        self.pending.append(chunk)
+        self.pending_chars += len(chunk)
+        if self.pending_chars >= STREAM_FLUSH_CHARS:
+            await self.flush()
+        elif self.timer is None:
+            # Bound the latency when the model pauses mid-response
+            self.timer = asyncio.get_running_loop().call_later(
+                STREAM_FLUSH_INTERVAL, self._on_timer
+            )
+
+    async def flush(self, frame: Optional[str] = None, end: bool = False):
+        """Send the pending text, followed by an optional extra frame
+
+        With end=True the pending text is flagged as the end of the response,
+        or a standalone stream_end is sent when nothing is pending.
+        """
+        self.cancel()
+        async with self.lock:
+            if self.pending:
+                content = "".join(self.pending)
+                self.pending.clear()
+                self.pending_chars = 0
+                flags = ""
+                if not self.started:
+                    flags = STREAM_START_FLAG
+                    self.started = True
+                if end:
+                    flags += STREAM_END_FLAG
+                await self.websocket.send_text(
+                    STREAM_PREFIX + orjson.dumps(content).decode() + flags + STREAM_SUFFIX
+                )
+            elif end:
+                await self.websocket.send_text(STREAM_END)
+            if frame is not None:
+                await self.websocket.send_text(frame)
+
+    def cancel(self):
+        """Cancel a scheduled timer flush"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def _on_timer(self):
+        self.timer = None
+        self.flush_task = asyncio.ensure_future(self._timed_flush())
+
+    async def _timed_flush(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.debug("Error flushing streamed chunks: %s", e)
+        finally:
+            self.flush_task = None
+
 # Models for request/response
 class ModelRequest(BaseModel):
     """Model request for chat API"""
     name: str
     prompt: str
 
+# Ollama endpoints
+OLLAMA_HOST = "127.0.0.1"
+OLLAMA_PORT = 11434
+OLLAMA_URL = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
+OLLAMA_API = f"{OLLAMA_URL}/api"
+
+# Request line and headers for streaming chats over a raw connection. HTTP/1.0
+# makes Ollama send the body unchunked and close the connection when done,
+# so the response body is plain NDJSON up to EOF.
+CHAT_REQUEST_HEAD = (
+    b"POST /api/chat HTTP/1.0\r\n"
+    b"Host: " + f"{OLLAMA_HOST}:{OLLAMA_PORT}".encode() + b"\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: %d\r\n"
+    b"\r\n"
+)
+
+# Request bodies to Ollama are assembled from pre-serialized JSON
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Autoreload for development, e.g. DEV=1 python ollama_server.py
+DEV_MODE = os.getenv("DEV", "").lower() in ("1", "true", "yes")
+
+# How long a successful health check is trusted, in seconds
+OLLAMA_CHECK_TTL = 5.0
+
 # Initialize the history manager
 history_manager = ModelHistoryManager()
 
-# Store active WebSocket connections
-active_connections: Dict[str, List[WebSocket]] = {}
+# Shared HTTP session for Ollama requests, created on startup so connections are reused
+http_session: Optional[aiohttp.ClientSession] = None
+
+# Monotonic time until which Ollama is assumed to be running
+_ollama_ok_until = 0.0
+
+# Store active WebSocket connections, keyed by the model's history name.
+# Each model maps to an insertion-ordered dict used as a set, so a socket
+# is dropped with a single pop
+active_connections: Dict[str, Dict[WebSocket, None]] = {}
+
+def register_connection(model: str, websocket: WebSocket):
+    """Track an open WebSocket for a model"""
+    active_connections.setdefault(model, {})[websocket] = None
+
+def unregister_connection(model: str, websocket: WebSocket):
+    """Stop tracking a WebSocket for a model"""
+    connections = active_connections.get(model)
+    if connections is None:
+        return
+    connections.pop(websocket, None)
+    if not connections:
+        del active_connections[model]
+
+async def broadcast(model: str, frame: str):
+    """Send one pre-encoded frame to every WebSocket open for a model"""
+    connections = list(active_connections.get(model, ()))
+    if not connections:
+        return
+
+    results = await asyncio.gather(
+        *(websocket.send_text(frame) for websocket in connections),
+        return_exceptions=True
+    )
+    # Prune sockets that could not be written to
+    for websocket, result in zip(connections, results):
+        if isinstance(result, Exception):
+            logger.debug("Dropping closed WebSocket for model %s: %s", model, result)
+            unregister_connection(model, websocket)
+
+def build_chat_body(model_name: str, model_history, stream: bool) -> bytes:
+    """Build an Ollama /api/chat request body from the pre-serialized history"""
+    return (b'{"model":' + orjson.dumps(model_name)
+            + b',"messages":' + model_history.get_messages_json()
+            + (b',"stream":true}' if stream else b',"stream":false}'))
+
+async def stream_ollama_chat(body: bytes):
+    """Post a chat request to Ollama and yield the NDJSON lines of its response"""
+    reader, writer = await asyncio.open_connection(OLLAMA_HOST, OLLAMA_PORT, limit=1 << 20)
+    try:
+        writer.write(CHAT_REQUEST_HEAD % len(body) + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        # Skip the response headers
+        while (await reader.readline()).strip():
+            pass
+
+        status = status_line.split(None, 2)
+        if len(status) < 2 or status[1] != b"200":
+            error = await reader.read()
+            raise RuntimeError(f"Ollama returned {status_line.decode().strip()}: "
+                               f"{error.decode(errors='replace').strip()}")
+
+        # Read large blocks and split complete NDJSON lines out of one buffer
+        buffer = bytearray()
+        while True:
+            block = await reader.read(65536)
+            if not block:
+                break
+            buffer += block
+            start = 0
+            end = buffer.find(b"\n")
+            while end != -1:
+                if end > start:
+                    yield bytes(buffer[start:end])
+                start = end + 1
+                end = buffer.find(b"\n", start)
+            del buffer[:start]
+        if buffer.strip():
+            yield bytes(buffer)
+    finally:
+        writer.close()
+
+def mark_ollama_running():
+    """Record a successful response from Ollama"""
+    global _ollama_ok_until
+    _ollama_ok_until = time.monotonic() + OLLAMA_CHECK_TTL
 
 async def is_ollama_running():
-    """Check if Ollama is running"""
+    """Check if Ollama is running, trusting a recent successful check"""
+    if time.monotonic() < _ollama_ok_until:
+        return True
+
     try:
-        process = await asyncio.create_subprocess_exec(
-            "ollama", "list",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        return process.returncode == 0
+        async with http_session.get(
+            OLLAMA_URL, timeout=aiohttp.ClientTimeout(total=0.5)
+        ) as response:
+            if response.status == 200:
+                mark_ollama_running()
+                return True
+            return False
     except Exception as e:
-        logger.error("Error checking Ollama status: %s", e)
+        logger.debug("Ollama health check failed: %s", e)
         return False
 
 async def ensure_ollama_running():
@@ -78,30 +294,15 @@ async def ensure_ollama_running():
 async def get_ollama_models():
     """Get a list of installed Ollama models"""
     try:
-        process = await asyncio.create_subprocess_exec(
-            "ollama", "list",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-
-        if process.returncode != 0:
-            logger.error("Error listing models: %s", stderr.decode())
-            return []
-
-        # Parse output to get model names
-        models = []
-        lines = stdout.decode().strip().split('\n')
-
-        # Skip header line
-        for line in lines[1:]:
-            if line.strip():
-                parts = line.split()
-                if parts:
-                    # Get model name
-                    models.append(parts[0])
-
-        return models
+        async with http_session.get(f"{OLLAMA_API}/tags") as response:
+            if response.status != 200:
+                logger.error("Error listing models: %s", await response.text())
+                return []
+            data = await response.json(loads=orjson.loads)
+
+        # A successful listing doubles as a health check
+        mark_ollama_running()
+        return [model["name"] for model in data.get("models", [])]
     except Exception as e:
         logger.error("Error getting Ollama models: %s", e)
         return []
@@ -120,20 +321,17 @@ async def websocket_endpoint(websocket: WebSocket, model_name: str):
 
     # Check if Ollama is running
     if not await ensure_ollama_running():
-        await websocket.send_text(json.dumps({
-            "type": "system",
-            "content": "Failed to start Ollama service"
-        }))
+        await websocket.send_text(OLLAMA_UNAVAILABLE)
         logger.error("Failed to start Ollama service for connection %s", connection_id)
         await websocket.close()
         return
 
     # Send welcome message
-    await websocket.send_text(json.dumps({
+    await websocket.send_text(orjson.dumps({
         "type": "welcome",
         "model": model_name,
-        "modelDisplayName": model_name.split(":")[0].capitalize()
-    }))
+        "modelDisplayName": canonical_model_name(model_name)
+    }).decode())
 
     # Get all previous messages and send to client
     previous_messages = model_history.get_messages()
@@ -142,16 +340,18 @@ async def websocket_endpoint(websocket: WebSocket, model_name: str):
     display_messages = [msg for msg in previous_messages if msg["role"] != "system"]
 
     if display_messages:
-        await websocket.send_text(json.dumps({
+        await websocket.send_text(orjson.dumps({
             "type": "history_loaded",
             "messages": display_messages
-        }))
+        }).decode())
+
+    register_connection(model_history.model_name, websocket)
 
     try:
         # Process messages
         while True:
             data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = orjson.loads(data)
 
             if message_data.get("type") == "message":
                 user_message = message_data.get("content", "")
@@ -159,11 +359,6 @@ async def websocket_endpoint(websocket: WebSocket, model_name: str):
                 # Add user message to chat history
                 model_history.add_message("user", user_message)
 
-                # Notify client that streaming is starting
-                await websocket.send_text(json.dumps({
-                    "type": "stream_start"
-                }))
-
                 # Process with Ollama, passing full context
                 await process_ollama_message(
                     websocket,
@@ -176,72 +371,52 @@ async def websocket_endpoint(websocket: WebSocket, model_name: str):
                 # Clear the chat history for this model
                 model_history.clear_history()
 
-                # Notify client that history was cleared
-                await websocket.send_text(json.dumps({
-                    "type": "history_cleared"
-                }))
+                # Notify every client on this model that history was cleared
+                await broadcast(model_history.model_name, HISTORY_CLEARED)
 
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected for model %s and connection %s", model_name, connection_id)
     finally:
-        # No need to explicitly save as it's saved after each message
-        pass
+        # Messages are saved as they are added, so only the connection needs cleanup
+        unregister_connection(model_history.model_name, websocket)
 
 async def process_ollama_message(websocket: WebSocket,
                                 model_name: str,
                                 model_history,
                                 connection_id: str):
     """Process a message with Ollama and stream the response"""
+    stream = StreamCoalescer(websocket)
     try:
-        # Get the current history context
-        context = model_history.get_messages()
-        logger.debug("Sending %d messages to Ollama", len(context))
-
         # Prepare the full context for Ollama
-        async with aiohttp.ClientSession() as http_session:
-            async with http_session.post(
-                "http://localhost:11434/api/chat",
-                json={
-                    "model": model_name,
-                    "messages": context,
-                    "stream": True
-                }
-            ) as response:
-                full_response = ""
-                async for line in response.content:
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            if "message" in data:
-                                chunk = data["message"].get("content", "")
-                                full_response += chunk
-
-                                # Stream each chunk to the client
-                                await websocket.send_text(json.dumps({
-                                    "type": "stream",
-                                    "content": chunk
-                                }))
-                        except Exception as e:
-                            logger.error("Error parsing line: %s", e)
-
-        # Signal end of stream
-        await websocket.send_text(json.dumps({
-            "type": "stream_end"
-        }))
+        body = build_chat_body(model_name, model_history, stream=True)
+        logger.debug("Sending %d bytes of context to Ollama", len(body))
+
+        chunks: List[str] = []
+        async for line in stream_ollama_chat(body):
+            if line.strip():
+                try:
+                    data = orjson.loads(line)
+                    if "message" in data:
+                        chunk = data["message"].get("content", "")
+                        chunks.append(chunk)
+
+                        # Stream the chunk to the client, coalesced with its neighbours
+                        await stream.add(chunk)
+                except Exception as e:
+                    logger.error("Error parsing line: %s", e)
+
+        # Send what is left, flagged as the end of the stream
+        await stream.flush(end=True)
 
         # Add assistant's response to the chat history
+        full_response = "".join(chunks)
         logger.info("Adding assistant response: %s...", full_response[:50])
         model_history.add_message("assistant", full_response)
 
     except Exception as e:
         logger.error("Error processing Ollama message: %s", e)
-        await websocket.send_text(json.dumps({
-            "type": "error",
-            "content": f"Error: {str(e)}"
-        }))
-        await websocket.send_text(json.dumps({
-            "type": "stream_end"
-        }))
+        await stream.flush(ERROR_PREFIX + orjson.dumps(f"Error: {e}").decode() + STREAM_SUFFIX)
+        await stream.flush(end=True)
 
 # API Endpoints
 @app.get("/")
@@ -276,7 +451,9 @@ async def get_model_chat_history(model_name: str):
 @app.post("/api/clear_history/{model_name}")
 async def clear_model_history(model_name: str):
     """Clear chat history for a specific model"""
-    history_manager.clear_model_history(model_name)
+    model_history = history_manager.get_model_history(model_name)
+    model_history.clear_history()
+    await broadcast(model_history.model_name, HISTORY_CLEARED)
     return {"status": "success", "message": f"Cleared history for model {model_name}"}
 
 @app.post("/api/chat")
@@ -293,29 +470,23 @@ async def chat(request: ModelRequest):
         model_history.add_message("user", request.prompt)
 
         # Get full context
-        context = model_history.get_messages()
+        body = build_chat_body(request.name, model_history, stream=False)
 
         # Make a request to Ollama API
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "http://localhost:11434/api/chat",
-                json={
-                    "model": request.name,
-                    "messages": context,
-                    "stream": False
-                }
-            ) as response:
-                result = await response.json()
-
-                if "message" in result:
-                    assistant_response = result["message"].get("content", "")
-
-                    # Add assistant response to history
-                    model_history.add_message("assistant", assistant_response)
-
-                    return {"response": assistant_response}
-                else:
-                    raise HTTPException(status_code=500, detail="Invalid response from Ollama")
+        async with http_session.post(
+            f"{OLLAMA_API}/chat", data=body, headers=JSON_HEADERS
+        ) as response:
+            result = await response.json(loads=orjson.loads)
+
+            if "message" in result:
+                assistant_response = result["message"].get("content", "")
+
+                # Add assistant response to history
+                model_history.add_message("assistant", assistant_response)
+
+                return {"response": assistant_response}
+            else:
+                raise HTTPException(status_code=500, detail="Invalid response from Ollama")
 
     except Exception as e:
         logger.error("Error in chat endpoint: %s", e)
@@ -325,9 +496,67 @@ async def chat(request: ModelRequest):
 @app.on_event("startup")
 async def startup_event():
     """Startup event to ensure Ollama is running"""
+    global http_session
     logger.info("Server starting up")
+    http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=128, keepalive_timeout=60)
+    )
     if not await ensure_ollama_running():
         logger.error("Failed to start Ollama service during startup")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Shutdown event to close the shared HTTP session"""
+    logger.info("Server shutting down")
+    if http_session is not None:
+        await http_session.close()
+
+def install_uring_loop() -> bool:
+    """Use the io_uring event loop from uringcore when it is installed and supported"""
+    if sys.platform != "linux":
+        return False
+    try:
+        kernel = tuple(int(part) for part in platform.release().split("-")[0].split(".")[:2])
+    except ValueError:
+        return False
+    if kernel < (5, 11):
+        return False
+    try:
+        import uringcore
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uringcore.EventLoopPolicy())
+    logger.info("Using the io_uring event loop")
+    return True
+
 if __name__ == "__main__":
-    uvicorn.run("ollama_server:app", host="0.0.0.0", port=8000, reload=True)
+    if DEV_MODE:
+        # The reload supervisor runs the app in a child process; keep it to development
+        uvicorn.run(
+            "ollama_server:app",
+            host="0.0.0.0",
+            port=8000,
+            # uvloop is not available on Windows
+            loop="asyncio" if sys.platform == "win32" else "uvloop",
+            http="httptools",
+            ws="websockets",
+            reload=True
+        )
+    else:
+        uring = install_uring_loop()
+        # A single worker: Ollama is the bottleneck, and chat histories live in this process
+        config = uvicorn.Config(
+            app,
+            host="0.0.0.0",
+            port=8000,
+            # "none" keeps the io_uring policy installed above; uvloop is not available on Windows
+            loop="none" if uring else "asyncio" if sys.platform == "win32" else "uvloop",
+            http="httptools",
+            ws="websockets",
+            ws_max_size=16 * 1024 * 1024,
+            backlog=2048,
+            # Leave room for many WebSockets to fan in to the one worker
+            limit_concurrency=1024,
+            lifespan="on"
+        )
+        uvicorn.Server(config).run()
@@ -7,6 +7,7 @@ import time
 import sys
 import subprocess
 import requests
+from requests.adapters import HTTPAdapter
 
 OLLAMA_API = "http://localhost:11434/api"
 
@@ -14,17 +15,20 @@ class OllamaAPI:
     """Client for interacting with the Ollama API"""
     def __init__(self, api_base=OLLAMA_API):
         self.api_base = api_base
+        # One pooled session keeps connections to Ollama alive between requests
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+        self.session.headers["Content-Type"] = "application/json"
 
     def _make_request(self, endpoint, method="GET", data=None):
         """Make a request to the Ollama API"""
         url = f"{self.api_base}/{endpoint}"
-        headers = {"Content-Type": "application/json"}
 
         try:
             if method == "GET":
-                response = requests.get(url, headers=headers)
+                response = self.session.get(url)
             elif method == "POST":
-                response = requests.post(url, headers=headers, json=data)
+                response = self.session.post(url, json=data)
             else:
                 raise ValueError(f"Unsupported method: {method}")
 
@@ -34,6 +38,14 @@ class OllamaAPI:
             print(f"API request error: {e}")
             return None
 
+    def is_running(self):
+        """Check whether the Ollama server is answering requests"""
+        try:
+            response = self.session.get(f"{self.api_base}/tags", timeout=1)
+            return response.status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
     def list_models(self):
         """Get a list of available models"""
         return self._make_request("tags")
@@ -66,6 +78,43 @@ class OllamaAPI:
 
         return self._make_request("chat", method="POST", data=data)
 
+    def pull_model(self, model_name, prefix=""):
+        """Pull a model, printing progress as it streams in
+
+        Returns True once the pull succeeds, False if Ollama reports an
+        error, and None if the request itself could not be made.
+        """
+        url = f"{self.api_base}/pull"
+
+        try:
+            with self.session.post(url, json={"name": model_name}, stream=True) as response:
+                response.raise_for_status()
+
+                last_status = None
+                last_percent = 0
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    progress = json.loads(line)
+                    if "error" in progress:
+                        print(f"{prefix}Pull error: {progress['error']}")
+                        return False
+
+                    # Only print when the step changes or every 10% within a step
+                    status = progress.get("status", "")
+                    total = progress.get("total")
+                    percent = progress.get("completed", 0) * 100 // total if total else None
+                    if status != last_status or (percent is not None and percent >= last_percent + 10):
+                        print(f"{prefix}{status}: {percent}%" if percent is not None
+                              else f"{prefix}{status}")
+                        last_status = status
+                        last_percent = percent or 0
+
+                return last_status == "success"
+        except requests.exceptions.RequestException as e:
+            print(f"API request error: {e}")
+            return None
+
     def generate_stream(self, model_name, prompt, options=None):
         """Generate a streaming completion for the given prompt"""
         data = {
@@ -78,25 +127,35 @@ class OllamaAPI:
             data.update(options)
 
         url = f"{self.api_base}/generate"
-        headers = {"Content-Type": "application/json"}
 
         try:
-            response = requests.post(url, headers=headers, json=data, stream=True)
+            response = self.session.post(url, json=data, stream=True)
             response.raise_for_status()
 
-            full_response = ""
-
-            for line in response.iter_lines():
-                if line:
-                    line_data = json.loads(line)
-                    if "response" in line_data:
-                        chunk = line_data["response"]
-                        full_response += chunk
-                        print(chunk, end="", flush=True)
-                    if line_data.get("done", False):
-                        break
+            chunks = []
+            buffer = bytearray()
+            done = False
+
+            # Take data as it arrives and split complete NDJSON lines out of one buffer
+            for block in response.iter_content(chunk_size=None):
+                buffer += block
+                start = 0
+                end = buffer.find(b"\n")
+                while end != -1 and not done:
+                    if end > start:
+                        line_data = json.loads(buffer[start:end])
+                        if "response" in line_data:
+                            chunk = line_data["response"]
+                            chunks.append(chunk)
+                            print(chunk, end="", flush=True)
+                        done = line_data.get("done", False)
+                    start = end + 1
+                    end = buffer.find(b"\n", start)
+                if done:
+                    break
+                del buffer[:start]
             print("\n")
-            return full_response
+            return "".join(chunks)
         except requests.exceptions.RequestException as e:
             print(f"API request error: {e}")
             return None
@@ -7,57 +7,105 @@ This script will:
 3. Allow the user to select a model by number
 4. Download the selected model
 """
-import json
+import functools
+import logging
+import shlex
 import subprocess
 import sys
 import time
 import os
+import selectors
+import socket
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import orjson
+from api_client import OllamaAPI
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_ADDRESS = ("127.0.0.1", 11434)
+# Characters that need a shell to interpret them in an install command
+SHELL_CHARS = frozenset("|&;<>()$`*?")
+# One line of the model menu, filled from a model entry plus its number
+_ROW = "  {n}. {name} ({parameters}) - {description}"
+
+@functools.lru_cache(maxsize=8)
+def _parse_models(path, mtime_ns, size):
+    """Parse the model list, cached until the file's mtime or size changes"""
+    with open(path, 'rb') as f:
+        data = orjson.loads(f.read())
+    models = data.get('models', [])
+    # Fill in the optional fields once, so the menu and callers can index them directly
+    for model in models:
+        model.setdefault('description', 'No description')
+        model.setdefault('parameters', 'N/A')
+    return tuple(models)
+
+@functools.lru_cache(maxsize=32)
+def _command_argv(command):
+    """Split an install command into argv, or None if it needs a shell"""
+    if SHELL_CHARS.intersection(command):
+        return None
+    return shlex.split(command)
 
 def load_models():
     """Load models from JSON file located two directories up"""
     script_dir = Path(os.path.dirname(os.path.abspath(__file__)))
     json_path = script_dir.parent / "model_list.json"
 
-    if not json_path.exists():
-        print(f"Error: JSON file not found at {json_path}")
+    try:
+        # One stat both checks the file exists and keys the parse cache
+        st = json_path.stat()
+    except FileNotFoundError:
+        logger.error("Error: JSON file not found at %s", json_path)
         return None
 
     try:
-        with open(json_path, 'r') as f:
-            data = json.load(f)
-        models = data.get('models', [])
+        models = _parse_models(str(json_path), st.st_mtime_ns, st.st_size)
         if not models:
             print("No models found in configuration file.")
             return None
 
-        print("\nAvailable models:")
-        for i, model in enumerate(models, 1):
-            name = model['name']
-            desc = model.get('description', 'No description')
-            params = model.get('parameters', 'N/A')
-            print(f"  {i}. {name} ({params}) - {desc}")
+        # Emit the whole menu with a single write
+        lines = ["\nAvailable models:"]
+        lines.extend(_ROW.format_map({"n": i, **model}) for i, model in enumerate(models, 1))
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
 
         return models
     except Exception as e:
-        print(f"Error loading models: {e}")
+        logger.error("Error loading models: %s", e)
         return None
 
-def download_model(model):
+def download_model(model, prefix=""):
     """Download a specific model using the command from the JSON"""
     name = model['name']
     command = model['command_install']
 
     print(f"\nDownloading model: {name}")
+
+    # Plain pulls go straight to the Ollama API; the CLI is the fallback
+    if command.startswith("ollama pull "):
+        tag = command[len("ollama pull "):].strip()
+        print(f"Pulling {tag} through the Ollama API")
+        pulled = OllamaAPI().pull_model(tag, prefix)
+        if pulled is not None:
+            if pulled:
+                print(f"\n✅ Successfully downloaded {name}")
+            else:
+                print(f"\n❌ Failed to download {name}")
+            return pulled
+        print("Falling back to the ollama command")
+
     print(f"Running command: {command}")
 
     try:
+        # Plain commands are run directly; only pipes, redirects and the like go through a shell
+        argv = _command_argv(command)
         result = subprocess.run(
-            command,
-            shell=True,
-            check=False,
-            text=True,
-            capture_output=False
+            command if argv is None else argv,
+            shell=argv is None,
+            check=False
         )
 
         if result.returncode == 0:
@@ -68,66 +116,101 @@ def download_model(model):
             return False
 
     except Exception as e:
-        print(f"\nError downloading model: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error downloading model: %s", e)
         return False
 
-def ensure_ollama_running():
-    """Check if Ollama is running, start it if not"""
+def download_many(models, concurrency=3):
+    """Download several models at once, returning whether each one succeeded"""
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Progress lines from concurrent pulls are tagged with the model name
+        return list(pool.map(lambda model: download_model(model, f"[{model['name']}] "), models))
+
+def _accepts_connections():
+    """Check whether something is listening on Ollama's port"""
     try:
-        result = subprocess.run(
-            ["ollama", "list"],
-            capture_output=True,
-            text=True
-        )
+        socket.create_connection(OLLAMA_ADDRESS, timeout=0.05).close()
+        return True
+    except OSError:
+        return False
 
-        if result.returncode == 0:
-            print("Ollama is running.")
-            return True
-    except Exception:
-        pass
+def _wait_ready(proc, deadline=5.0):
+    """Wait for a freshly started Ollama to accept connections
+
+    Returns early when the server process exits. On Linux the wait is
+    woken by a pidfd; elsewhere the process is polled between attempts.
+    """
+    end = time.monotonic() + deadline
+    selector = None
+    pidfd = None
+    if hasattr(os, "pidfd_open"):
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+            selector = selectors.DefaultSelector()
+            selector.register(pidfd, selectors.EVENT_READ)
+        except OSError:
+            selector = None
+
+    delay = 0.025
+    try:
+        while not _accepts_connections():
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return False
+            wait = min(delay, remaining)
+            if selector is not None:
+                if selector.select(wait):
+                    # The server exited; another instance may still have the port
+                    return _accepts_connections()
+            elif proc.poll() is not None:
+                return _accepts_connections()
+            else:
+                time.sleep(wait)
+            delay = min(delay * 2, 0.5)
+        return True
+    finally:
+        if selector is not None:
+            selector.close()
+        if pidfd is not None:
+            os.close(pidfd)
+
+def ensure_ollama_running():
+    """Check if Ollama is running, start it if not"""
+    api = OllamaAPI()
+    if api.is_running():
+        print("Ollama is running.")
+        return True
 
     print("Ollama is not running. Attempting to start...")
 
     try:
-        subprocess.Popen(
+        proc = subprocess.Popen(
             ["ollama", "serve"],
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL
         )
 
         print("Waiting for Ollama to start...")
-        for _ in range(5):
-            time.sleep(1)
-            try:
-                result = subprocess.run(
-                    ["ollama", "list"],
-                    capture_output=True,
-                    text=True
-                )
-                if result.returncode == 0:
-                    print("Ollama started successfully.")
-                    return True
-            except Exception:
-                pass
+        if _wait_ready(proc):
+            print("Ollama started successfully.")
+            return True
 
         print("Failed to start Ollama automatically.")
         return False
     except Exception as e:
-        print(f"Error starting Ollama: {e}")
+        logger.error("Error starting Ollama: %s", e)
         return False
 
 def main():
     """Main entry point for the script"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print("=" * 60)
     print("Ollama Model Downloader")
     print("=" * 60)
 
     try:
-        subprocess.run(["ollama", "--version"], 
-                     stdout=subprocess.PIPE, 
-                     stderr=subprocess.PIPE)
+        subprocess.run(["ollama", "--version"],
+                     stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL)
     except FileNotFoundError:
         print("Error: Ollama not found. Please install Ollama first.")
         print("Visit https://ollama.com for installation instructions.")
@@ -144,32 +227,43 @@ def main():
 
     while True:
         try:
-            choice = input("\nEnter the number of the model you want to download (or 'q' to quit): ")
+            choice = input("\nEnter the number of the model you want to download, "
+                           "or several separated by commas (or 'q' to quit): ")
 
             if choice.lower() in ['q', 'quit', 'exit']:
                 print("Exiting...")
                 return 0
 
-            model_idx = int(choice) - 1
+            model_indices = [int(part) - 1 for part in choice.split(",")]
 
-            if 0 <= model_idx < len(models):
-                selected_model = models[model_idx]
+            if all(0 <= model_idx < len(models) for model_idx in model_indices):
+                # Drop repeated numbers, keeping the order they were entered in
+                selected_models = [models[model_idx] for model_idx in dict.fromkeys(model_indices)]
                 break
             else:
-                print(f"Invalid selection. Please enter a number between 1 and {len(models)}.")
+                print(f"Invalid selection. Please enter numbers between 1 and {len(models)}.")
         except ValueError:
             print("Please enter a valid number.")
 
-    success = download_model(selected_model)
-
-    if success:
-        print(f"\nModel {selected_model['name']} has been downloaded and is ready to use.")
-        print("You can run it with:")
-        print(f"  {selected_model['command_run']}")
+    if len(selected_models) == 1:
+        results = [download_model(selected_models[0])]
     else:
-        print("\nDownload failed. Please check your connection and try again.")
+        results = download_many(selected_models)
+
+    # Collect the summary for every model and write it out once
+    summary = []
+    for selected_model, success in zip(selected_models, results):
+        name = selected_model['name']
+        if success:
+            summary.append(f"\nModel {name} has been downloaded and is ready to use.\n"
+                           f"You can run it with:\n  {selected_model['command_run']}\n")
+        else:
+            summary.append(f"\nDownload of {name} failed. "
+                           "Please check your connection and try again.\n")
+    sys.stdout.write("".join(summary))
+    sys.stdout.flush()
 
-    return 0 if success else 1
+    return 0 if all(results) else 1
 
 if __name__ == "__main__":
     sys.exit(main())
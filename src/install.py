@@ -1,4 +1,5 @@
 """Script to install Ollama on the system"""
+import functools
 import subprocess
 import os
 import sys
@@ -18,12 +19,12 @@ def print_colored(text, color):
 
 def check_ollama_installed():
     """Check if Ollama is installed on the system"""
-    try:
-        subprocess.run(["ollama", "--version"],
-                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
-        return True
-    except FileNotFoundError:
-        return False
+    return shutil.which("ollama") is not None
+
+@functools.lru_cache(maxsize=None)
+def _detect_linux_pkg_mgr():
+    """Return the first package manager found on PATH, or None"""
+    return next((manager for manager in ("apt", "dnf", "yum") if shutil.which(manager)), None)
 
 def install_ollama():
     """Install Ollama based on the operating system"""
@@ -35,29 +36,14 @@ def install_ollama():
     if system == "linux":
         # Linux installation
         try:
-            # Check if we can use apt (Debian/Ubuntu)
-            if os.path.exists("/usr/bin/apt"):
-                print("Detected Debian/Ubuntu system, using apt...")
-                subprocess.run(
-                    "curl -fsSL https://ollama.com/install.sh | sh",
-                    shell=True,
-                    check=True
-                )
-            # Check if we can use yum/dnf (Fedora/RHEL/CentOS)
-            elif os.path.exists("/usr/bin/dnf") or os.path.exists("/usr/bin/yum"):
-                print("Detected Fedora/RHEL/CentOS system, using yum/dnf...")
-                subprocess.run(
-                    "curl -fsSL https://ollama.com/install.sh | sh",
-                    shell=True,
-                    check=True
-                )
-            else:
-                print("Using generic Linux installation method...")
-                subprocess.run(
-                    "curl -fsSL https://ollama.com/install.sh | sh",
-                    shell=True,
-                    check=True
-                )
+            # The install script handles every distribution itself
+            pkg_mgr = _detect_linux_pkg_mgr()
+            print(f"Detected {pkg_mgr or 'generic'} Linux system, using the install script...")
+            subprocess.run(
+                "curl -fsSL https://ollama.com/install.sh | sh",
+                shell=True,
+                check=True
+            )
             print_colored("Ollama installed successfully.", GREEN)
             return True
         except subprocess.CalledProcessError as e:
@@ -100,9 +86,12 @@ def install_ollama():
             # Use requests to download if available
             try:
                 print("Downloading with requests...")
-                response = requests.get(installer_url)
-                with open(installer_path, "wb") as f:
-                    f.write(response.content)
+                # Stream to disk in 1 MiB blocks instead of holding the whole installer in memory
+                with requests.get(installer_url, stream=True, timeout=30) as response:
+                    response.raise_for_status()
+                    with open(installer_path, "wb", buffering=1 << 20) as f:
+                        for chunk in response.iter_content(chunk_size=1 << 20):
+                            f.write(chunk)
             except (ImportError, Exception) as e:
                 print(f"Failed to download with requests: {e}")
                 print("Falling back to PowerShell...")
@@ -8,30 +8,18 @@ This script will:
 """
 import subprocess
 import sys
+from api_client import OllamaAPI
 
 def get_installed_models():
     """Get list of installed models from Ollama"""
     try:
-        result = subprocess.run(
-            ["ollama", "list"], 
-            capture_output=True, 
-            text=True
-        )
+        model_data = OllamaAPI().list_models()
 
-        if result.returncode != 0:
-            print(f"Error listing models: {result.stderr}")
+        if not model_data or "models" not in model_data:
+            print("Error listing models: no response from Ollama")
             return []
 
-        lines = result.stdout.strip().split('\n')
-        models = []
-
-        for line in lines[1:]:
-            if line.strip():
-                parts = line.split()
-                if parts:
-                    models.append(parts[0])
-
-        return models
+        return [model["name"] for model in model_data["models"]]
     except Exception as e:
         print(f"Error getting installed models: {e}")
         return []
@@ -62,18 +50,10 @@ def interactive_mode(model_name):
 
 def ensure_ollama_running():
     """Check if Ollama is running, start it if not"""
-    try:
-        result = subprocess.run(
-            ["ollama", "list"],
-            capture_output=True,
-            text=True
-        )
-
-        if result.returncode == 0:
-            print("Ollama is running.")
-            return True
-    except Exception:
-        pass
+    api = OllamaAPI()
+    if api.is_running():
+        print("Ollama is running.")
+        return True
 
     print("Ollama is not running. Attempting to start...")
 
@@ -86,19 +66,12 @@ def ensure_ollama_running():
 
         print("Waiting for Ollama to start...")
         import time
-        for _ in range(5):
-            time.sleep(1)
-            try:
-                result = subprocess.run(
-                    ["ollama", "list"],
-                    capture_output=True,
-                    text=True
-                )
-                if result.returncode == 0:
-                    print("Ollama started successfully.")
-                    return True
-            except Exception:
-                pass
+        # The HTTP probe is cheap, so poll often within the same 5 second window
+        for _ in range(25):
+            time.sleep(0.2)
+            if api.is_running():
+                print("Ollama started successfully.")
+                return True
 
         print("Failed to start Ollama automatically.")
         return False
@@ -113,9 +86,9 @@ def main():
     print("=" * 60)
 
     try:
-        subprocess.run(["ollama", "--version"], 
-                     stdout=subprocess.PIPE, 
-                     stderr=subprocess.PIPE)
+        subprocess.run(["ollama", "--version"],
+                     stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL)
     except FileNotFoundError:
         print("Error: Ollama not found. Please install Ollama first.")
         print("Visit https://ollama.com for installation instructions.")